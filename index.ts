@@ -63,6 +63,20 @@ export class EBSSnapshotEvalStack extends cdk.Stack {
       }
     );
 
+    // Index used by the processing status checker to read only pending evaluations
+    snapshotEvalResultsTable.addGlobalSecondaryIndex({
+      indexName: "PendingIndex",
+      partitionKey: {
+        name: "JobId",
+        type: cdk.aws_dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: "completed",
+        type: cdk.aws_dynamodb.AttributeType.STRING,
+      },
+      projectionType: cdk.aws_dynamodb.ProjectionType.KEYS_ONLY,
+    });
+
     //  ======= SQS Queue =======  //
     const snapshotJobQueue = new cdk.aws_sqs.Queue(
       this,
@@ -126,6 +140,11 @@ export class EBSSnapshotEvalStack extends cdk.Stack {
     snapshotJobQueue.grantSendMessages(snapshotJobInitLambda);
 
     //  ======= Snapshot Evaluation Lambda Function & Associated Permissions =======  //
+    // The EBS direct APIs are rate limited - records in flight across all evaluator invocations
+    // is evalRecordsPerInvocation x evalMaxConcurrency (10, the same as one record per invocation).
+    // Each record runs up to 3 list calls in parallel, and shares the invocation's timeout and memory.
+    const evalRecordsPerInvocation = 2;
+    const evalMaxConcurrency = 5;
     const evalSnapshotLambda = new lambda.Function(this, "EvalSnapshots", {
       code: new lambda.InlineCode(
         fs.readFileSync("src/snapshot_evaluator.py", { encoding: "utf-8" })
@@ -140,6 +159,7 @@ export class EBSSnapshotEvalStack extends cdk.Stack {
         LOG_LEVEL: "INFO",
         DDB_EVAL_RESULTS: snapshotEvalResultsTable.tableName,
         S3_BUCKET_NAME: snapshotEvalBucket.bucketName,
+        RECORD_WORKERS: String(evalRecordsPerInvocation),
       },
     });
 
@@ -173,9 +193,10 @@ export class EBSSnapshotEvalStack extends cdk.Stack {
       "EvalSnapshotEventSource",
       {
         target: evalSnapshotLambda,
-        batchSize: 1,
+        batchSize: evalRecordsPerInvocation,
         eventSourceArn: snapshotJobQueue.queueArn,
-        maxConcurrency: 10,
+        maxConcurrency: evalMaxConcurrency,
+        reportBatchItemFailures: true,
       }
     );
 
@@ -2,28 +2,209 @@ import io
 import os
 import csv
 import json
+import collections
+import gzip
 import time
+import threading
+import contextlib
+import concurrent.futures
+from operator import itemgetter
 import boto3
+from botocore.config import Config
+from boto3.dynamodb.types import TypeDeserializer
+from boto3.s3.transfer import TransferConfig
 
+# Multipart settings used when streaming the CSV output to S3
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
 
-def lambda_handler(event, context):
-    """Function to pull results based on a `jobid` from the Snapshot Evalution Results in DynamoDB and output to S3."""
-    ddb_table = os.environ.get('DDB_EVAL_RESULTS')
+# Setup AWS Clients (reused across warm invocations)
+# Connection pool sized for the concurrent multipart uploads of both CSV streams.
+# Short connect timeout + adaptive retries avoid long stalls on a slow connection.
+# Set S3_ACCEL=1 to use S3 Transfer Acceleration (must be enabled on the bucket).
+s3 = boto3.client('s3', config=Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    connect_timeout=3,
+    read_timeout=30,
+    retries={'mode': 'adaptive', 'max_attempts': 5},
+    s3={'use_accelerate_endpoint': os.environ.get('S3_ACCEL') == '1'}
+))
+dynamodb = boto3.client('dynamodb')
+ddb_deserializer = TypeDeserializer()
+eval_results_table_name = os.environ.get('DDB_EVAL_RESULTS')
 
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table(ddb_table)
 
-    response = table.query(
-        KeyConditionExpression=boto3.dynamodb.conditions.Key(
-            'JobId').eq(event['jobid'])
-    )
+class UploadAborted(IOError):
+    """Raised by AbortableReader once the CSV stream has been aborted"""
+
+
+class AbortableReader:
+    """
+    File object wrapper whose reads raise once `aborted` is set, so upload_fileobj
+    fails (and aborts the multipart upload) rather than completing with partial data.
+    """
+
+    def __init__(self, fileobj, aborted: threading.Event):
+        self.fileobj = fileobj
+        self.aborted = aborted
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        if self.aborted.is_set():
+            raise UploadAborted('CSV stream aborted, upload cancelled')
+        return data
+
+
+@contextlib.contextmanager
+def s3_csv_stream(s3_client, bucket: str, key: str):
+    """
+    Yields a text stream whose contents are gzip compressed and uploaded to S3 (multipart) while it is being written.
+    Memory use is bounded by the multipart chunk size rather than the size of the CSV.
+    If the body raises, the upload is aborted so no partial object is written to S3.
+    """
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, 'rb')
+    raw_writer = os.fdopen(write_fd, 'wb')
+    # GzipFile writes are unbuffered, so buffer ahead of the compressor
+    gzip_writer = gzip.GzipFile(fileobj=raw_writer, mode='wb', compresslevel=1)
+    writer = io.TextIOWrapper(
+        io.BufferedWriter(gzip_writer, buffer_size=1024 * 1024), encoding='utf-8', newline='')
+    aborted = threading.Event()
+
+    def upload():
+        try:
+            s3_client.upload_fileobj(
+                AbortableReader(reader, aborted), bucket, key,
+                ExtraArgs={'ContentType': 'application/gzip'}, Config=S3_TRANSFER_CONFIG)
+        finally:
+            # unblocks the writer (BrokenPipeError) if the upload fails early
+            reader.close()
 
+    def close_streams():
+        # GzipFile does not close the file object it wraps
+        for stream in (writer, raw_writer):
+            try:
+                stream.close()
+            except BrokenPipeError:
+                pass
+
+    def raise_upload_error(stream_error: BaseException):
+        # A failed upload closes the pipe, so writes fail with BrokenPipeError -
+        # raise the upload's (S3) error rather than the broken pipe
+        upload_error = upload_future.exception()
+        if (isinstance(stream_error, OSError) and upload_error is not None
+                and not isinstance(upload_error, UploadAborted)):
+            raise upload_error from stream_error
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        upload_future = executor.submit(upload)
+        try:
+            yield writer
+        except BaseException as body_error:
+            # set before closing, so the reader raises instead of seeing the end of the stream
+            aborted.set()
+            close_streams()
+            raise_upload_error(body_error)
+            raise
+        try:
+            close_streams()
+        except OSError as close_error:
+            raise_upload_error(close_error)
+            raise
+        # raises the upload's error if it failed (a broken pipe on close is ignored above)
+        upload_future.result()
+
+
+def encode_csv_gzip(fieldnames: list, rows: list):
+    """Function to encode a (small) list of rows as gzip compressed CSV bytes"""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=1) as gzip_writer, \
+            io.TextIOWrapper(gzip_writer, encoding='utf-8', newline='') as stream:
+        writer = csv.DictWriter(stream, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def rows_to_s3(rows: list):
+    """Function to take a JSON input (list of rows) and output to CSV in S3 bucket. Headers are taken from the first row."""
     s3_bucket = os.environ.get('S3_BUCKET_NAME')
-    s3_object_name = f"ebs_snapshot_evaluation_{time.strftime('%Y%m%d%H%M%S')}.csv"
-    s3_error_object_name = f"ebs_snapshot_evaluation_errors_{time.strftime('%Y%m%d%H%M%S')}.csv"
+    s3_object_name = f"ebs_snapshot_evaluation_{time.strftime('%Y%m%d%H%M%S')}.csv.gz"
+
+    with s3_csv_stream(s3, s3_bucket, s3_object_name) as stream:
+        writer = csv.DictWriter(stream, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    return {"output_location": f"s3://{s3_bucket}/{s3_object_name}"}
 
-    stream = io.StringIO()
-    error_stream = io.StringIO()
+
+def get_eval_results(jobid: str, error_counts: collections.Counter):
+    """
+    Generator over the Snapshot Evaluation Results of a job, read page by page from DynamoDB.
+    Yields (snapshot_id, eval_result, error_message) - error_message is None for a successful evaluation.
+    Errors are tallied by type in `error_counts` (rather than logged per snapshot).
+    """
+    # Low-level client used so only the data attribute needs deserializing.
+    # ProjectionExpression used to only return the attributes written to the CSVs
+    pages = dynamodb.get_paginator('query').paginate(
+        TableName=eval_results_table_name,
+        KeyConditionExpression='JobId = :jobid',
+        ExpressionAttributeValues={':jobid': {'S': jobid}},
+        ProjectionExpression='SnapshotId, #data',
+        ExpressionAttributeNames={'#data': 'data'},
+        PaginationConfig={'PageSize': 1000}
+    )
+
+    for page in pages:
+        for item in page['Items']:
+            snapshot_id = item['SnapshotId']['S']
+
+            if 'data' not in item:
+                error_counts['missing'] += 1
+                yield snapshot_id, None, 'No data was captured for this snapshot.'
+                continue
+
+            try:
+                # results are stored as a DynamoDB Map, older results as a JSON string
+                if 'M' in item['data']:
+                    eval_result = ddb_deserializer.deserialize(item['data'])
+                else:
+                    eval_result = json.loads(item['data']['S'])
+
+                if 'error_message' in eval_result:
+                    error_message = '{}: {}'.format(
+                        eval_result['error_code'], eval_result['error_message'])
+                    error_counts['errored'] += 1
+                    yield snapshot_id, None, error_message
+                    continue
+
+            except Exception:
+                error_counts['invalid'] += 1
+                yield snapshot_id, None, 'invalid data format'
+                continue
+
+            yield snapshot_id, eval_result, None
+
+
+def lambda_handler(event, context):
+    """Function to pull results based on a `jobid` from the Snapshot Evalution Results in DynamoDB and output to S3.
+
+    If the event is a list of result rows (rather than a `jobid`), the rows are written to S3 as-is.
+    """
+    if isinstance(event, list):
+        return rows_to_s3(event)
+
+    s3_bucket = os.environ.get('S3_BUCKET_NAME')
+    # single timestamp so the output and errors files always match
+    timestamp = time.strftime('%Y%m%d%H%M%S')
+    s3_object_name = f"ebs_snapshot_evaluation_{timestamp}.csv.gz"
+    s3_error_object_name = f"ebs_snapshot_evaluation_errors_{timestamp}.csv.gz"
 
     data_headers = [
         'target_snapshot',
@@ -39,46 +220,44 @@ def lambda_handler(event, context):
         'cost_estimate_90days_target_snapshot_in_archive_tier'
     ]
 
-    writer = csv.DictWriter(stream, fieldnames=data_headers)
-    writer.writeheader()
+    jobid = event['jobid']
 
-    error_writer = csv.DictWriter(error_stream, fieldnames=[
-                                  'JobId', 'SnapshotId', 'ErrorMessage'])
-    error_writer.writeheader()
+    # Errors are rare - collect them and only upload an errors CSV if there are any
+    error_rows = []
+    error_counts = collections.Counter()
 
-    for item in response['Items']:
-        if 'data' not in item:
-            print('No data was captured for snapshot {}. Adding to errors output.'.format(
-                item['SnapshotId']))
-            error_writer.writerow(
-                {'JobId': item['JobId'], 'SnapshotId': item['SnapshotId'], 'ErrorMessage': 'No data was captured for this snapshot.'})
-            continue
+    # CSV rows are streamed to S3 as the results are read
+    with s3_csv_stream(s3, s3_bucket, s3_object_name) as stream:
 
-        try:
-            eval_result = json.loads(item['data'])
+        # csv.writer + itemgetter avoids DictWriter's per-row dict to list rebuild
+        row_values = itemgetter(*data_headers)
+        writer = csv.writer(stream)
+        writer.writerow(data_headers)
 
-            if 'error_message' in eval_result:
-                print('Error Message found for snapshot {}. Adding to errors output.'.format(
-                    item['SnapshotId']))
-                error_writer.writerow(
-                    {'JobId': item['JobId'], 'SnapshotId': item['SnapshotId'], 'ErrorMessage': '{}: {}'.format(eval_result['error_code'], eval_result['error_message'])})
+        for snapshot_id, eval_result, error_message in get_eval_results(jobid, error_counts):
+            if error_message:
+                error_rows.append(
+                    {'JobId': jobid, 'SnapshotId': snapshot_id, 'ErrorMessage': error_message})
                 continue
 
-        except Exception as e:
-            print('Error Encountered', e)
-            error_writer.writerow(
-                {'JobId': item['JobId'], 'SnapshotId': item['SnapshotId'], 'ErrorMessage': 'invalid data format'})
-            continue
+            try:
+                writer.writerow(row_values(eval_result))
+            except KeyError:
+                # partial results (e.g. no surrounding snapshots evaluated) leave columns empty
+                writer.writerow([eval_result.get(header, '')
+                                for header in data_headers])
 
-        writer.writerow(eval_result)
+    print("Consolidation summary: missing={} errored={} invalid={}".format(
+        error_counts['missing'], error_counts['errored'], error_counts['invalid']))
 
-    csv_string_object = stream.getvalue()
-    error_csv_string = error_stream.getvalue()
+    if not error_rows:
+        return {"output_location": f"s3://{s3_bucket}/{s3_object_name}", "errors_location": None}
 
-    session = boto3.session.Session()
-    s3 = session.resource('s3')
-
-    s3.Object(s3_bucket, s3_object_name).put(Body=csv_string_object)
-    s3.Object(s3_bucket, s3_error_object_name).put(Body=error_csv_string)
+    s3.put_object(
+        Bucket=s3_bucket,
+        Key=s3_error_object_name,
+        Body=encode_csv_gzip(['JobId', 'SnapshotId', 'ErrorMessage'], error_rows),
+        ContentType='application/gzip'
+    )
 
     return {"output_location": f"s3://{s3_bucket}/{s3_object_name}", "errors_location": f"s3://{s3_bucket}/{s3_error_object_name}"}
@@ -1,11 +1,33 @@
+import concurrent.futures
 import boto3
 
+# Setup AWS Clients (reused across warm invocations)
+ec2 = boto3.client('ec2')
+
+# Max number of start-time shards described concurrently
+MAX_SHARD_WORKERS = 12
 
-def lambda_handler(event, context):
-    """Function to get a list of EBS Snapshots. By default, will filter for completed snapshots in the standard storage tier - owned by the current account."""
 
-    client = boto3.client('ec2')
+def describe_snapshot_ids(snapshot_filter: list, max_items=None):
+    """Function to page through describe_snapshots and return the matching snapshot ids"""
+    page_iterator = ec2.get_paginator('describe_snapshots').paginate(
+        OwnerIds=['self'],
+        Filters=snapshot_filter,
+        PaginationConfig={
+            'PageSize': 1000,
+            'MaxItems': max_items
+        }
+    )
+
     snapshot_ids = []
+    for page in page_iterator:
+        snapshot_ids.extend(
+            [{"target_snapshot": snapshot['SnapshotId']} for snapshot in page['Snapshots']])
+    return snapshot_ids
+
+
+def lambda_handler(event, context):
+    """Function to get a list of EBS Snapshots. By default, will filter for completed snapshots in the standard storage tier - owned by the current account."""
 
     default_snapshot_filter = [
         {
@@ -28,15 +50,24 @@ def lambda_handler(event, context):
     else:
         snapshot_filter = default_snapshot_filter
 
-    page_iterator = client.get_paginator('describe_snapshots').paginate(
-        OwnerIds=['self'],
-        Filters=snapshot_filter
-    )
-    for page in page_iterator:
-        for snapshot in page['Snapshots']:
-            snapshot_ids.append({
-                "target_snapshot": snapshot['SnapshotId']
-            }
-            )
+    # Optionally cap the number of snapshots returned (Step Functions payloads are limited to 256 KB)
+    max_items = event.get('max')
 
-    return snapshot_ids
+    # Optionally shard the listing by start-time filter values (e.g. ["2023-01-*", "2023-02-*"])
+    # and describe the shards concurrently. The shards supplied must cover the snapshots in scope.
+    if 'start_time_shards' not in event:
+        return describe_snapshot_ids(snapshot_filter, max_items)
+
+    shard_filters = [
+        snapshot_filter + [{'Name': 'start-time', 'Values': [shard]}]
+        for shard in event['start_time_shards']
+    ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_SHARD_WORKERS) as executor:
+        shard_results = executor.map(
+            lambda shard_filter: describe_snapshot_ids(shard_filter, max_items), shard_filters)
+
+        snapshot_ids = []
+        for shard_snapshot_ids in shard_results:
+            snapshot_ids.extend(shard_snapshot_ids)
+
+    return snapshot_ids[:max_items]
@@ -9,35 +9,39 @@ import os
 import boto3
 from boto3.dynamodb.conditions import Key
 
+# Setup AWS Clients (reused across warm invocations)
+dynamodb = boto3.resource('dynamodb')
+eval_results_table = dynamodb.Table(os.environ['DDB_EVAL_RESULTS'])
+
+# GSI keyed on (JobId, completed) - lets us read only the pending items for a job
+PENDING_INDEX_NAME = 'PendingIndex'
 
-def lambda_handler(event, context):
-    dynamodb = boto3.resource('dynamodb')
-    ddb_table_name = os.environ['DDB_EVAL_RESULTS']
-    table = dynamodb.Table(ddb_table_name)
 
-    # query table where primary key starts with the jobid
+def lambda_handler(event, context):
+    # query the pending index where primary key is the jobid
     # and where the completed field is false
-    # ProjectionExpression used to not needlessly return larger result set
-    response = table.query(
-        KeyConditionExpression=Key('JobId').eq(event['jobid']),
-        FilterExpression=Key('completed').eq('false'),
-        ProjectionExpression="JobId,SnapshotId,completed"
-    )
-    data = response['Items']
+    # Using a key condition (not a filter) so only pending items are read (and billed)
+    # Select COUNT used to only return the number of matching items (no item payload)
+    query_kwargs = {
+        'IndexName': PENDING_INDEX_NAME,
+        'KeyConditionExpression': Key('JobId').eq(event['jobid']) & Key('completed').eq('false'),
+        'Select': 'COUNT'
+    }
+    response = eval_results_table.query(**query_kwargs)
+    num_jobs_pending = response['Count']
 
     # handle pagination from ddb query
-    while 'LastEvaluatedKey' in response:
-        response = table.query(
-            KeyConditionExpression=Key('JobId').eq(event['jobid']),
-            FilterExpression=Key('completed').eq('false'),
-            ProjectionExpression="JobId,SnapshotId,completed",
+    # Stop as soon as a page reports pending items - we only need to know processing isn't finished.
+    # num_jobs_pending is then a lower bound (exact unless pending keys span more than one 1 MB page).
+    while num_jobs_pending == 0 and 'LastEvaluatedKey' in response:
+        response = eval_results_table.query(
+            **query_kwargs,
             ExclusiveStartKey=response['LastEvaluatedKey']
         )
-        data.extend(response['Items'])
+        num_jobs_pending += response['Count']
 
     # if the query returns results, we still have processing to do
-    if len(data) > 0:
-        num_jobs_pending = len(data)
+    if num_jobs_pending > 0:
         print(f"Still processing. {num_jobs_pending} jobs pending")
         return {
             "jobid": event['jobid'],
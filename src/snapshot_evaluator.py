@@ -18,15 +18,24 @@ To avoid multiple requests to the pricing API, this function expects to receive
 payload. This is sourced in the init stage of the overarching evaluation solution. 
 """
 
+import array
+import collections
+import concurrent.futures
 import decimal
+import functools
+import itertools
 import json
 import logging
 import os
+import sys
 import zlib
 from datetime import datetime
 from enum import Enum
+from operator import itemgetter
 import boto3
 import botocore.exceptions
+from botocore.config import Config
+from boto3.dynamodb.types import TypeSerializer
 
 
 class EvalScenario(Enum):
@@ -37,46 +46,110 @@ class EvalScenario(Enum):
     AFTER = 4
 
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            if obj.is_zero():
-                return "0"
-            return str(obj)
-        return json.JSONEncoder.default(self, obj)
+# Summary of a snapshot's blocks - pages are discarded once counted
+SnapshotSummary = collections.namedtuple(
+    'SnapshotSummary', ['volume_size', 'block_size', 'block_count'])
+
+
+def decimal_to_str(obj):
+    """Converts a Decimal to its string form (exceeds DynamoDB number precision otherwise)"""
+    if obj.is_zero():
+        return "0"
+    return str(obj)
 
 
 # Setup logging
 logger = logging.getLogger()
+logger.setLevel(logging.DEBUG if os.environ.get(
+    'LOG_LEVEL') == "DEBUG" else logging.INFO)
 for libname in ["boto3", "botocore", "urllib3"]:
     logging.getLogger(libname).setLevel(logging.WARNING)
 
+# Environment configuration (read once per container - a missing variable fails the Lambda init)
+s3_bucket = os.environ['S3_BUCKET_NAME']
+eval_results_table_name = os.environ['DDB_EVAL_RESULTS']
+S3_CACHE_PREFIX = 'cache/'
+
 # Detect current region
 aws_session = boto3.session.Session()
 current_aws_region = aws_session.region_name
 
-# Setup AWS Clients
-s3 = boto3.client('s3')
-ec2 = boto3.client('ec2')
-ebs = boto3.client('ebs')
-dynamodb = boto3.client('dynamodb')
+# Setup AWS Clients (reused across warm invocations)
+# Connection pool sized for concurrent requests, adaptive retries for the rate limited EBS direct APIs.
+client_config = Config(
+    max_pool_connections=50,
+    retries={'mode': 'adaptive', 'max_attempts': 10}
+)
+# Created from the one session so the service models/credentials are only loaded once (cold start).
+s3 = aws_session.client('s3', config=client_config)
+ec2 = aws_session.client('ec2', config=client_config)
+ebs = aws_session.client('ebs', config=client_config)
+dynamodb = aws_session.client('dynamodb', config=client_config)
+ddb_serializer = TypeSerializer()
+
+# botocore loads paginator models and builds the modeled exception classes on first use -
+# do it here so it happens once in the Lambda init phase, not in the first evaluation.
+describe_snapshots_paginator = ec2.get_paginator('describe_snapshots')
+s3.exceptions  # pylint: disable=pointless-statement
+ebs.exceptions  # pylint: disable=pointless-statement
+ec2.exceptions  # pylint: disable=pointless-statement
+
+# Number of SQS records (snapshots) evaluated concurrently - matches the event source batch size.
+# Set from the stack (RECORD_WORKERS), sized so the total EBS direct API concurrency stays bounded.
+MAX_RECORD_WORKERS = int(os.environ.get('RECORD_WORKERS', '2'))
+
+# Number of volume snapshot listings kept (per job) in memory
+VOLUME_SNAPSHOTS_CACHE_SIZE = 128
+
+# Number of changed block comparisons kept in memory - scaled with the function memory
+# (a comparison is 4 bytes per changed block, up to ~128 MB for a fully changed 16 TiB volume)
+CHANGED_BLOCKS_CACHE_SIZE = max(
+    1, int(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '1024')) // 256)
+
+# Largest page size accepted by the EBS direct list APIs
+EBS_MAX_RESULTS = 10000
+
+# Changed block cache objects hold packed little-endian int32 block indexes (zlib compressed).
+# Older JSON cache entries (.json.zlib) are not read - they expire under the cache/ lifecycle rule.
+CACHE_KEY_SUFFIX = '.i32'
+
+
+def paginate_ebs(operation, **kwargs):
+    """
+    Generator over the pages of an EBS direct API list call.
+    botocore does not provide paginators for the EBS direct APIs.
+
+    Pages are requested at the maximum page size, and the next page is prefetched
+    (on a worker thread) while the caller processes the current one.
+    NextTokens are sequential, so only one page can be fetched ahead.
+    """
+    kwargs.setdefault('MaxResults', EBS_MAX_RESULTS)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        response = operation(**kwargs)
+        while "NextToken" in response:
+            next_response = executor.submit(
+                operation, **kwargs, NextToken=response["NextToken"])
+            yield response
+            response = next_response.result()
+        yield response
 
 
 def get_snapshot_blocks(snapshot: str):
-    """Function to get the snapshot blocks by calling list_snapshot_blocks"""
+    """
+    Function to get the snapshot block details (SnapshotSummary) by calling list_snapshot_blocks.
+    Only the number of blocks is needed, so pages are counted as they arrive (not retained).
+    """
     try:
-        ebs_response = ebs.list_snapshot_blocks(
-            SnapshotId=snapshot
+        pages = paginate_ebs(ebs.list_snapshot_blocks, SnapshotId=snapshot)
+        first_page = next(pages)
+        block_count = len(first_page['Blocks'])
+        for page in pages:
+            block_count += len(page['Blocks'])
+        return SnapshotSummary(
+            volume_size=first_page['VolumeSize'],
+            block_size=first_page['BlockSize'],
+            block_count=block_count
         )
-        blocks = ebs_response['Blocks']
-        while "NextToken" in ebs_response:
-            ebs_response = ebs.list_snapshot_blocks(
-                SnapshotId=snapshot,
-                NextToken=ebs_response["NextToken"])
-            blocks.extend(ebs_response["Blocks"])
-        # overwrite with complete array (in case of pagination)
-        ebs_response["Blocks"] = blocks
-        return ebs_response
     # handle the ResourceNotFoundException from the list_snapshot_blocks api call
     except botocore.exceptions.ClientError as e:
         if e.response['Error']['Code'] == 'ResourceNotFoundException':
@@ -99,16 +172,19 @@ def calculate_approx_full_snapshot_size(number_of_blocks: int,
     return number_of_blocks * block_size_bytes
 
 
+BYTES_PER_MB = decimal.Decimal(1048576)     # (2^20 = 1024 x 1024 = 1,048,576)
+BYTES_PER_GB = decimal.Decimal(1073741824)  # (2^30 = 1024 x 1024 x 1024 = 1,073,741,824)
+COST_ESTIMATE_MONTHS = decimal.Decimal(3)   # 3-month (90 day) cost estimates
+
+
 def bytes_to_mb(size_in_bytes: int):
-    """Function to convert bytes to MB"""
-    BYTES_PER_MB = 1048576         # (2^20 = 1024 x 1024 = 1,048,576)
-    return decimal.Decimal(size_in_bytes/BYTES_PER_MB)
+    """Function to convert bytes to MB (Decimal division, no float rounding)"""
+    return decimal.Decimal(size_in_bytes) / BYTES_PER_MB
 
 
 def bytes_to_gb(size_in_bytes: int):
-    """Function to convert bytes to GB"""
-    BYTES_PER_GB = 1073741824  # (2^30 = 1024 x 1024 x 1024 = 1,073,741,824)
-    return decimal.Decimal(size_in_bytes/BYTES_PER_GB)
+    """Function to convert bytes to GB (Decimal division, no float rounding)"""
+    return decimal.Decimal(size_in_bytes) / BYTES_PER_GB
 
 
 def get_source_volume_id(snapshot_id: str):
@@ -132,7 +208,9 @@ def get_volume_snapshots(ebs_volume_id: str):
     Function calls the AWS API and returns all snapshots for the
     EBS Volume supplied
     """
-    ec2_response = ec2.describe_snapshots(
+    # OwnerIds narrows the server side scan to our own snapshots (skips public snapshots)
+    pages = describe_snapshots_paginator.paginate(
+        OwnerIds=['self'],
         Filters=[
             {
                 'Name': 'volume-id',
@@ -141,23 +219,25 @@ def get_volume_snapshots(ebs_volume_id: str):
                 ]
             },
         ],
+        PaginationConfig={'PageSize': 1000},
     )
-    snapshots = ec2_response['Snapshots']
-    while "NextToken" in ec2_response:
-        ec2_response = ec2.describe_snapshots(
-            Filters=[
-                {
-                    'Name': 'volume-id',
-                    'Values': [
-                        ebs_volume_id,
-                    ]
-                },
-            ],
-            NextToken=ec2_response["NextToken"])
-        snapshots.extend(ec2_response["Snapshots"])
-    # overwrite with complete array (in case of pagination)
-    ec2_response["Snapshots"] = snapshots
-    return ec2_response
+    return {
+        "Snapshots": list(itertools.chain.from_iterable(page['Snapshots'] for page in pages))
+    }
+
+
+@functools.lru_cache(maxsize=VOLUME_SNAPSHOTS_CACHE_SIZE)
+def get_job_volume_snapshots(jobid: str, ebs_volume_id: str):
+    """
+    Function returns the snapshots for the EBS Volume supplied, cached per job for the life of the Lambda container.
+    Sibling snapshots of a volume in the same job reuse the listing rather than calling describe_snapshots again.
+    Only the fields used by the evaluation are kept.
+    """
+    snapshots = get_volume_snapshots(ebs_volume_id)["Snapshots"]
+    return {
+        "Snapshots": [{"SnapshotId": snapshot["SnapshotId"], "StartTime": snapshot["StartTime"]}
+                      for snapshot in snapshots]
+    }
 
 
 def sort_snapshots_by_created_date(snapshots: list):
@@ -165,7 +245,8 @@ def sort_snapshots_by_created_date(snapshots: list):
     Function to sort all of the snapshots by the creation date.
     Creation Date == StartTime
     """
-    sorted_snapshots = sorted(snapshots, key=lambda x: x.get('StartTime'))
+    # EC2 always returns StartTime, itemgetter avoids a lambda call per snapshot
+    sorted_snapshots = sorted(snapshots, key=itemgetter('StartTime'))
     return sorted_snapshots
 
 
@@ -174,16 +255,16 @@ def get_surrounding_snapshots(list_of_snapshots: list, the_target_snapshot: str)
 
     If either the before or after snapshot is not found, returns None.
     """
-    snap_before = snap_after = None
-    num_of_snapshots = len(list_of_snapshots)
-
-    for index, snapshot in enumerate(list_of_snapshots):
-        if snapshot["SnapshotId"] == the_target_snapshot:
-            if index > 0:
-                snap_before = list_of_snapshots[index - 1]
-            if index < (num_of_snapshots - 1):    # i.e. if not the last snapshot
-                snap_after = list_of_snapshots[index + 1]
-            break
+    # itemgetter + list.index keep the search for the target in C (no per-snapshot Python code)
+    snapshot_ids = list(map(itemgetter("SnapshotId"), list_of_snapshots))
+    try:
+        index = snapshot_ids.index(the_target_snapshot)
+    except ValueError:
+        return None, None
+
+    snap_before = list_of_snapshots[index - 1] if index > 0 else None
+    # i.e. if not the last snapshot
+    snap_after = list_of_snapshots[index + 1] if index < (len(list_of_snapshots) - 1) else None
     return snap_before, snap_after
 
 
@@ -213,60 +294,84 @@ def determine_eval_scenario(snapshot_before, snapshot_after):
             "Encountered an evaluation scenario which isn't currently catered for.")
 
 
-def compress_json(data):
-    """Function to compress the json string"""
-    return zlib.compress(json.dumps(data).encode("utf-8"))
+def pack_block_indexes(block_indexes: array.array):
+    """Function to pack block indexes (int32 array) as compressed little-endian int32s"""
+    if sys.byteorder == 'big':
+        block_indexes = array.array('i', block_indexes)
+        block_indexes.byteswap()
+    return zlib.compress(block_indexes.tobytes())
 
 
-def decompress_json(data):
-    """Function to decompress the json string"""
-    return json.loads(zlib.decompress(data).decode("utf-8"))
+def unpack_block_indexes(data):
+    """Function to unpack compressed little-endian int32 block indexes"""
+    block_indexes = array.array('i')
+    block_indexes.frombytes(zlib.decompress(data))
+    if sys.byteorder == 'big':
+        block_indexes.byteswap()
+    return block_indexes
 
 
 def get_cached_changed_blocks(snap1: str, snap2: str):
     """Function to get the cached changed blocks from the cache"""
     logger.info(
-        f"Checking Cache for changed blocks between {snap1} and {snap2}")
-    s3_bucket = os.environ['S3_BUCKET_NAME']
-    s3_base_path = 'cache/'
-    cache_key = f"{snap1}_{snap2}.json.zlib"
+        "Checking Cache for changed blocks between %s and %s", snap1, snap2)
+    cache_key = f"{snap1}_{snap2}{CACHE_KEY_SUFFIX}"
     try:
-        # if file exists in S3
-        s3_object = s3.get_object(
-            Bucket=s3_bucket, Key=s3_base_path + cache_key)
+        # if file exists in S3 - a single GET (a missing key is the cache miss)
+        try:
+            s3_object = s3.get_object(
+                Bucket=s3_bucket, Key=S3_CACHE_PREFIX + cache_key)
+        except s3.exceptions.NoSuchKey:
+            logger.info('Cache Miss')
+            return False
         logger.info('Cache Hit')
-        result = decompress_json(s3_object['Body'].read())
-        # Cache only stores the list of blocks, not the expected json structure.
+        # Cache only stores the block indexes, not the expected json structure.
         return {
-            "ChangedBlocks": result
+            "ChangedBlockIndexes": unpack_block_indexes(s3_object['Body'].read())
         }
-    except s3.exceptions.NoSuchKey:
-        logger.info('Cache Miss')
-        return False
     except Exception as error:
         logger.warning("We hit an error exception during cache check")
         logger.warning(error)
         return False
 
 
-def store_cached_changed_blocks(snap1: str, snap2: str, changed_blocks: list):
-    """Function to store the changed blocks in the cache"""
-    logger.info(f"Storing changed blocks between {snap1} and {snap2} in cache")
-    cache_key = f"{snap1}_{snap2}.json.zlib"
-    s3_bucket = os.environ['S3_BUCKET_NAME']
-    s3_base_path = 'cache/'
-    # upload json dump of changed_blocks to file in s3 using cache_key
+def store_cached_changed_blocks(snap1: str, snap2: str, changed_block_indexes: array.array):
+    """Function to store the changed block indexes in the cache"""
+    logger.info("Storing changed blocks between %s and %s in cache", snap1, snap2)
+    cache_key = f"{snap1}_{snap2}{CACHE_KEY_SUFFIX}"
+    # upload the packed changed_block_indexes to file in s3 using cache_key
     s3.put_object(
         Bucket=s3_bucket,
-        Key=s3_base_path + cache_key,
-        Body=compress_json(changed_blocks)
+        Key=S3_CACHE_PREFIX + cache_key,
+        Body=pack_block_indexes(changed_block_indexes)
     )
 
-    logger.info(f"Stored changed blocks between {snap1} and {snap2} in cache.")
+    logger.info("Stored changed blocks between %s and %s in cache.", snap1, snap2)
 
 
 def get_changed_blocks(snap1: str, snap2: str):
-    """Function calles the list_changed_blocks API and returns the response"""
+    """
+    Function returns the changed blocks between two snapshots, or None if a snapshot can't be found.
+    Only the block indexes are kept (ChangedBlockIndexes, an int32 array) - the block tokens aren't needed.
+    """
+    try:
+        return list_changed_blocks(snap1, snap2)
+    except ebs.exceptions.ResourceNotFoundException:
+        # This is an edge case that could be hit
+        # Depends on initial EBS Snapshot filtering or live env changes
+        logger.error(
+            'ERROR. We were not able to find this snapshot whilst assessing blocks. It is likely not in a completed state (perhaps deleted). Please try again!')
+        return None
+
+
+@functools.lru_cache(maxsize=CHANGED_BLOCKS_CACHE_SIZE)
+def list_changed_blocks(snap1: str, snap2: str):
+    """
+    Function calles the list_changed_blocks API and returns the response.
+    Results are also kept in memory, a snapshot pair is often needed twice in a batch
+    (as the "after" comparison of one snapshot and the "before" comparison of the next).
+    Errors (e.g. a snapshot that isn't completed yet) raise, so are not cached.
+    """
 
     cached_result = get_cached_changed_blocks(snap1, snap2)
     if cached_result:
@@ -274,68 +379,211 @@ def get_changed_blocks(snap1: str, snap2: str):
     else:
         # Grab data from the API
         try:
-            ebs_response = ebs.list_changed_blocks(
-                FirstSnapshotId=snap1,
-                SecondSnapshotId=snap2,
-            )
-            blocks = ebs_response['ChangedBlocks']
-            while "NextToken" in ebs_response:
-                ebs_response = ebs.list_changed_blocks(
-                    FirstSnapshotId=snap1,
-                    SecondSnapshotId=snap2,
-                    NextToken=ebs_response["NextToken"])
-                blocks.extend(ebs_response["ChangedBlocks"])
-            # overwrite with complete array (in case of pagination)
-            ebs_response["ChangedBlocks"] = blocks
-
-            # strip response of fields (tokens) we don't need
-            for block in ebs_response["ChangedBlocks"]:
-                if "FirstBlockToken" in block:
-                    del block["FirstBlockToken"]
-                if "SecondBlockToken" in block:
-                    del block["SecondBlockToken"]
+            pages = paginate_ebs(ebs.list_changed_blocks,
+                                 FirstSnapshotId=snap1, SecondSnapshotId=snap2)
+            first_page = next(pages)
+            # project each block to its index as the pages arrive (tokens are dropped with the page)
+            # int32 array - 4 bytes per block rather than a list entry + int object
+            changed_block_indexes = array.array(
+                'i', [block["BlockIndex"] for block in first_page['ChangedBlocks']])
+            for page in pages:
+                changed_block_indexes.extend(
+                    [block["BlockIndex"] for block in page['ChangedBlocks']])
+            ebs_response = {
+                "VolumeSize": first_page.get('VolumeSize'),
+                "BlockSize": first_page.get('BlockSize'),
+                "ChangedBlockIndexes": changed_block_indexes
+            }
+
             # store the result in the cache
             store_cached_changed_blocks(
-                snap1, snap2, changed_blocks=ebs_response["ChangedBlocks"])
+                snap1, snap2, changed_block_indexes=changed_block_indexes)
             return ebs_response
         except ebs.exceptions.ValidationException as error:
             logger.warning(
-                f"WARN - We hit a validation exception - {error.response['Error']['Message']}")
+                "WARN - We hit a validation exception - %s", error.response['Error']['Message'])
             if "is empty" in error.response['Error']['Message']:
                 # Let's handle the empty snapshot edge case
                 # Crafting a "no changed blocks" api response to return
                 no_changed_blocks_response = {
-                    'ChangedBlocks': [],
+                    'ChangedBlockIndexes': array.array('i'),
                     'ExpiryTime': datetime(2022, 1, 1),
                     'VolumeSize': 123,
                     'BlockSize': 123,
                 }
                 return no_changed_blocks_response
             raise
-        except ebs.exceptions.ResourceNotFoundException as error:
-            # This is an edge case that could be hit
-            # Depends on initial EBS Snapshot filtering or live env changes
-            logger.error(
-                'ERROR. We were not able to find this snapshot whilst assessing blocks. It is likely not in a completed state (perhaps deleted). Please try again!')
-            return None
 
 
-def main(target_snapshot: str, pricing: dict):
-    """This function contains the main script logic flow"""
+def count_changed_block_indexes(block_indexes_before: array.array, block_indexes_after: array.array):
+    """
+    Returns the number of unique block indexes in the before-to-target comparison,
+    and the number of block indexes found in both comparisons.
+    """
+    block_indexes_before = set(block_indexes_before)
+    # A block index is only listed once per comparison, so the after-indexes are
+    # streamed against the before set rather than building a second set.
+    num_in_both = len(block_indexes_before.intersection(block_indexes_after))
+    return len(block_indexes_before), num_in_both
+
+
+def evaluate_neither_scenario(target_snapshot: str, snapshot_before, snapshot_after, snapshot_blocks: SnapshotSummary):
+    """
+    NEITHER - no surrounding snapshots, just this one snapshot to consider.
+    Returns the (approx size, approx size removed) of the target snapshot in bytes.
+    """
+    # We already have the block information gathered for this scenario (just the one snapshot)
+    approx_size_target_snapshot_bytes = calculate_approx_full_snapshot_size(
+        number_of_blocks=snapshot_blocks.block_count,
+        block_size_bytes=snapshot_blocks.block_size
+    )
+    return approx_size_target_snapshot_bytes, approx_size_target_snapshot_bytes
+
+
+def evaluate_both_scenario(target_snapshot: str, snapshot_before, snapshot_after, snapshot_blocks: SnapshotSummary):
+    """
+    BOTH - both before and after snapshots exist - full change block eval route (per doco).
+    Returns the (approx size, approx size removed) of the target snapshot in bytes, or None if a snapshot wasn't found.
+    """
+    logger.info(
+        'Step 6b - Getting changed blocks between previous and target snapshots, and target and subsequent snapshots...')
+    # We check the blocks changed for both (before>target and target>after) snapshot references.
+    # The two comparisons are independent, so they are fetched concurrently.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        changed_blocks_before_future = executor.submit(
+            get_changed_blocks, snap1=snapshot_before["SnapshotId"], snap2=target_snapshot)
+        changed_blocks_after_future = executor.submit(
+            get_changed_blocks, snap1=target_snapshot, snap2=snapshot_after["SnapshotId"])
+        changed_blocks_before = changed_blocks_before_future.result()
+        changed_blocks_after = changed_blocks_after_future.result()
+
+    if changed_blocks_before is None or changed_blocks_after is None:
+        return None
+
+    logger.info(
+        'Step 7 - Comparing block indexes to identify unreferenced data in target snapshot...')
+
+    # Not every snapshot would get removed though, so how much would be removed?
+    # The blocks that are in both comparisons would be deleted if this snapshot was removed.
+    num_changed_blocks_before, num_blocks_in_both_comparisons = count_changed_block_indexes(
+        changed_blocks_before["ChangedBlockIndexes"], changed_blocks_after["ChangedBlockIndexes"])
+
+    # Snapshot size is ANY changed blocks in the before-to-target changed blocks comparison
+    approx_size_target_snapshot_bytes = num_changed_blocks_before * \
+        snapshot_blocks.block_size
+
+    # Calculate the amount of space that would be saved by moving this snapshot to archive tier
+    approx_size_target_snapshot_removed_bytes = num_blocks_in_both_comparisons * \
+        snapshot_blocks.block_size
+
+    return approx_size_target_snapshot_bytes, approx_size_target_snapshot_removed_bytes
+
+
+def evaluate_before_scenario(target_snapshot: str, snapshot_before, snapshot_after, snapshot_blocks: SnapshotSummary):
+    """
+    BEFORE - only the before snapshot exists, none after (i.e. target is most likely the most recent snapshot) - target snap includes 1 set of changed blocks.
+    Returns the (approx size, approx size removed) of the target snapshot in bytes, or None if a snapshot wasn't found.
+    """
+    logger.info(
+        'Step 6b - Getting changed blocks between previous and target snapshots...')
+    changed_blocks_before = get_changed_blocks(
+        snap1=snapshot_before["SnapshotId"], snap2=target_snapshot)
+    if changed_blocks_before is None:
+        return None
+
+    logger.info(
+        'Step 7 - Changed block delta contains the unreferenced (changed) data in target snapshot...')
+
+    # Snapshot size is ANY changed blocks in the before-to-target changed blocks comparison
+    approx_size_target_snapshot_bytes = len(
+        changed_blocks_before["ChangedBlockIndexes"]) * snapshot_blocks.block_size
+
+    return approx_size_target_snapshot_bytes, approx_size_target_snapshot_bytes
+
+
+def evaluate_after_scenario(target_snapshot: str, snapshot_before, snapshot_after, snapshot_blocks: SnapshotSummary):
+    """
+    AFTER - only the after snapshot exists, none before (i.e. first snapshot of volume) - target snap includes it's blocks.
+    Returns the (approx size, approx size removed) of the target snapshot in bytes, or None if a snapshot wasn't found.
+    """
+    # No prior snapshots = target snapshot does not reference blocks. Has everything.
+    # in the next snapshot (after) any blocks not in the changed list must be retained.
+    logger.info(
+        'Step 6b - Getting changed blocks between target snapshot and subsequent snapshot...')
+    changed_blocks_after = get_changed_blocks(
+        snap1=target_snapshot, snap2=snapshot_after["SnapshotId"])
+    if changed_blocks_after is None:
+        return None
+
+    logger.info(
+        'Step 7 - Changed block delta contains amount of blocks that would be no longer referenced in target snapshot...')
+
+    # Snapshot size is ALL blocks in the snapshot
+    approx_size_target_snapshot_bytes = snapshot_blocks.block_count * \
+        snapshot_blocks.block_size
+
+    # Expected savings = any block indexes that have changed (and thus aren't referenced in other snapshots)
+    approx_size_target_snapshot_removed_bytes = len(
+        changed_blocks_after["ChangedBlockIndexes"]) * snapshot_blocks.block_size
+
+    return approx_size_target_snapshot_bytes, approx_size_target_snapshot_removed_bytes
+
+
+# Evaluation function for each scenario
+SCENARIO_EVALUATORS = {
+    EvalScenario.NEITHER: evaluate_neither_scenario,
+    EvalScenario.BOTH: evaluate_both_scenario,
+    EvalScenario.BEFORE: evaluate_before_scenario,
+    EvalScenario.AFTER: evaluate_after_scenario,
+}
+
+
+def main(target_snapshot: str, pricing: dict, source_volume_id: str = None, jobid: str = None):
+    """This function contains the main script logic flow
+
+    If the source volume id is already known (e.g. from the snapshot listing), Step 2 is skipped.
+    If a jobid is supplied, the source volume's snapshot listing is shared with the job's other snapshots.
+    """
 
     # Expects EBS pricing to be supplied from upstream/calling function
     EBS_STD_SNAPSHOT_PRICE_GB_MONTH = pricing['std_tier_snapshot_pricing']
     EBS_ARCHIVE_SNAPSHOT_PRICE_GB_MONTH = pricing['archive_tier_snapshot_pricing']
 
     logger.info(
-        f"Starting Evaluation of target Snaphot Id: {target_snapshot}")
+        "Starting Evaluation of target Snaphot Id: %s", target_snapshot)
 
     eval_data = {}
     eval_data["target_snapshot"] = target_snapshot
 
-    # Step 1 - Determine Full Snapshot Size
-    logger.info("Step 1 - Determining the full size of the EBS snapshot...")
-    snapshot_blocks = get_snapshot_blocks(target_snapshot)
+    # Steps 1 and 2 are independent, and Step 3 only needs Step 2 - so the API calls are overlapped.
+    # Results are still checked in step order below.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        # Step 1 - Determine Full Snapshot Size
+        logger.info("Step 1 - Determining the full size of the EBS snapshot...")
+        snapshot_blocks_future = executor.submit(
+            get_snapshot_blocks, target_snapshot)
+
+        # Step 2 - Find Source Volume
+        logger.info(
+            "Step 2 - Identifying the source EBS volume from the EBS snapshot...")
+        if source_volume_id:
+            snapshot_source_volume_id = source_volume_id
+        else:
+            snapshot_source_volume_id = get_source_volume_id(
+                snapshot_id=target_snapshot)
+
+        # Step 3 - Find all of the snapshots created from the source volume
+        if snapshot_source_volume_id is not None:
+            logger.info(
+                "Step 3 - Finding all snapshots of the source EBS volume...")
+            if jobid:
+                all_volume_snapshots_future = executor.submit(
+                    get_job_volume_snapshots, jobid, snapshot_source_volume_id)
+            else:
+                all_volume_snapshots_future = executor.submit(
+                    get_volume_snapshots, ebs_volume_id=snapshot_source_volume_id)
+
+        snapshot_blocks = snapshot_blocks_future.result()
 
     if snapshot_blocks is None:
         error_msg = f"Unable to find snapshot blocks for snapshot: {target_snapshot}"
@@ -345,22 +593,16 @@ def main(target_snapshot: str, pricing: dict):
         eval_data["error_code"] = "SNAPSHOT_BLOCKS_NOT_FOUND"
         return eval_data
 
-    eval_data["source_ebs_volume_size_gb"] = snapshot_blocks['VolumeSize']
-    snapshot_block_size_bytes = snapshot_blocks['BlockSize']
+    eval_data["source_ebs_volume_size_gb"] = snapshot_blocks.volume_size
+    snapshot_block_size_bytes = snapshot_blocks.block_size
     eval_data["snapshot_block_size_bytes"] = snapshot_block_size_bytes
-    number_of_blocks = len(snapshot_blocks["Blocks"])
+    number_of_blocks = snapshot_blocks.block_count
     approx_full_snapshot_size_bytes = calculate_approx_full_snapshot_size(
         number_of_blocks=number_of_blocks,
         block_size_bytes=snapshot_block_size_bytes
     )
     eval_data["approx_full_snapshot_size_bytes"] = approx_full_snapshot_size_bytes
 
-    # Step 2 - Find Source Volume
-    logger.info(
-        "Step 2 - Identifying the source EBS volume from the EBS snapshot...")
-    snapshot_source_volume_id = get_source_volume_id(
-        snapshot_id=target_snapshot)
-
     if snapshot_source_volume_id is None:
         error_msg = f"Error identifying the source volume for snapshot: {target_snapshot}"
         logger.error(error_msg)
@@ -370,10 +612,7 @@ def main(target_snapshot: str, pricing: dict):
 
     eval_data["snapshot_source_volume_id"] = snapshot_source_volume_id
 
-    # Step 3 - Find all of the snapshots created from the source volume
-    logger.info("Step 3 - Finding all snapshots of the source EBS volume...")
-    all_volume_snapshots = get_volume_snapshots(
-        ebs_volume_id=snapshot_source_volume_id)
+    all_volume_snapshots = all_volume_snapshots_future.result()
 
     # Step 4 - Sort the snapshots
     logger.info("Step 4 - Sorting the snapshots by created date...")
@@ -388,7 +627,7 @@ def main(target_snapshot: str, pricing: dict):
 
     if snapshot_before:
         logger.info(
-            f"Step 5a - Snapshot Before Target Snapshot: {snapshot_before['SnapshotId']}")
+            "Step 5a - Snapshot Before Target Snapshot: %s", snapshot_before['SnapshotId'])
         eval_data["snapshot_before"] = snapshot_before['SnapshotId']
     else:
         logger.info("Step 5a - Snapshot Before Target Snapshot: None")
@@ -396,7 +635,7 @@ def main(target_snapshot: str, pricing: dict):
 
     if snapshot_after:
         logger.info(
-            f"Step 5a - Snapshot After Target Snapshot: {snapshot_after['SnapshotId']}")
+            "Step 5a - Snapshot After Target Snapshot: %s", snapshot_after['SnapshotId'])
         eval_data["snapshot_after"] = snapshot_after['SnapshotId']
     else:
         logger.info("Step 5a - Snapshot After Target Snapshot: None")
@@ -417,134 +656,31 @@ def main(target_snapshot: str, pricing: dict):
     current_eval_scenario = determine_eval_scenario(
         snapshot_before, snapshot_after)
 
-    if current_eval_scenario == EvalScenario.NEITHER:
-        # We already have the block information gathered for this scenario (just the one snapshot)
-        approx_size_target_snapshot_bytes = approx_full_snapshot_size_bytes
-        eval_data["approx_size_target_snapshot_bytes"] = approx_size_target_snapshot_bytes
-
-        approx_size_target_snapshot_removed_bytes = approx_size_target_snapshot_bytes
-        eval_data["approx_size_target_snapshot_removed_bytes"] = approx_size_target_snapshot_removed_bytes
-
-    if current_eval_scenario == EvalScenario.BOTH:
-
-        logger.info(
-            'Step 6b - Getting changed blocks between previous and target snapshots...')
-        # We check the blocks changed for both (before>target and target>after) snapshot references.
-        changed_blocks_before = get_changed_blocks(
-            snap1=snapshot_before["SnapshotId"], snap2=target_snapshot)
-        if changed_blocks_before is None:
-            error_msg = f"Unable to find snapshot during changed block analysis: {target_snapshot}"
-            logger.error(error_msg)
-            eval_data["error_message"] = error_msg
-            eval_data["error_code"] = "SNAPSHOT_NOT_FOUND"
-            return eval_data
-
-        logger.info(
-            'Step 6b - Getting changed blocks between target snapshot and subsequent snapshot...')
-        changed_blocks_after = get_changed_blocks(
-            snap1=target_snapshot, snap2=snapshot_after["SnapshotId"])
-        if changed_blocks_after is None:
-            error_msg = f"Unable to find snapshot during changed block analysis: {target_snapshot}"
-            logger.error(error_msg)
-            eval_data["error_message"] = error_msg
-            eval_data["error_code"] = "SNAPSHOT_NOT_FOUND"
-            return eval_data
-
-        logger.info(
-            'Step 7 - Comparing block indexes to identify unreferenced data in target snapshot...')
-
-        # Making a list of all blocks found in the before-to-target changed blocks comparison
-        seen_changed_block_index_before = []
-        for b in changed_blocks_before["ChangedBlocks"]:
-            seen_changed_block_index_before.append(b["BlockIndex"])
-
-        # Making a list of all blocks found in the target-to-after changed blocks comparison
-        seen_changed_block_index_after = []
-        for b in changed_blocks_after["ChangedBlocks"]:
-            seen_changed_block_index_after.append(b["BlockIndex"])
-
-        # Snapshot size is ANY changed blocks in the before-to-target changed blocks comparison
-        approx_size_target_snapshot_bytes = len(
-            seen_changed_block_index_before) * snapshot_blocks['BlockSize']
-
-        # Not every snapshot would get removed though, so how much would be removed?
-        # Using set intersection to find the blocks that are in both comparisons.
-        # This would be the blocks that are deleted if this snapshot was removed.
-        block_indexes_in_both_comparisons = set(seen_changed_block_index_before).intersection(
-            set(seen_changed_block_index_after))
-
-        # Calculate the amount of space that would be saved by moving this snapshot to archive tier
-        approx_size_target_snapshot_removed_bytes = len(
-            block_indexes_in_both_comparisons) * snapshot_blocks['BlockSize']
-
-        eval_data["approx_size_target_snapshot_bytes"] = approx_size_target_snapshot_bytes
-        eval_data["approx_size_target_snapshot_removed_bytes"] = approx_size_target_snapshot_removed_bytes
-
-    if current_eval_scenario == EvalScenario.BEFORE:
-        # BEFORE - only the before snapshot exists, none after (i.e. target is most likely the most recent snapshot) - target snap includes 1 set of changed blocks
-        logger.info(
-            'Step 6b - Getting changed blocks between previous and target snapshots...')
-        changed_blocks_before = get_changed_blocks(
-            snap1=snapshot_before["SnapshotId"], snap2=target_snapshot)
-        if changed_blocks_before is None:
-            error_msg = f"Unable to find snapshot during changed block analysis: {target_snapshot}"
-            logger.error(error_msg)
-            eval_data["error_message"] = error_msg
-            eval_data["error_code"] = "SNAPSHOT_NOT_FOUND"
-            return eval_data
-
-        logger.info(
-            'Step 7 - Changed block delta contains the unreferenced (changed) data in target snapshot...')
-
-        # Snapshot size is ANY changed blocks in the before-to-target changed blocks comparison
-        approx_size_target_snapshot_bytes = len(
-            changed_blocks_before["ChangedBlocks"]) * snapshot_blocks['BlockSize']
-
-        approx_size_target_snapshot_removed_bytes = approx_size_target_snapshot_bytes
-
-        eval_data["approx_size_target_snapshot_bytes"] = approx_size_target_snapshot_bytes
-        eval_data["approx_size_target_snapshot_removed_bytes"] = approx_size_target_snapshot_removed_bytes
-
-    if current_eval_scenario == EvalScenario.AFTER:
-        # No prior snapshots = target snapshot does not reference blocks. Has everything.
-        # in the next snapshot (after) any blocks not in the changed list must be retained.
-        logger.info(
-            'Step 6b - Getting changed blocks between target snapshot and subsequent snapshot...')
-        changed_blocks_after = get_changed_blocks(
-            snap1=target_snapshot, snap2=snapshot_after["SnapshotId"])
-        if changed_blocks_after is None:
-            error_msg = f"Unable to find snapshot during changed block analysis: {target_snapshot}"
-            logger.error(error_msg)
-            eval_data["error_message"] = error_msg
-            eval_data["error_code"] = "SNAPSHOT_NOT_FOUND"
-            return eval_data
-
-        logger.info(
-            'Step 7 - Changed block delta contains amount of blocks that would be no longer referenced in target snapshot...')
-
-        # Snapshot size is ALL blocks in the snapshot
-        approx_size_target_snapshot_bytes = len(
-            snapshot_blocks['Blocks']) * snapshot_blocks['BlockSize']
-
-        # Expected savings = any block indexes that have changed (and thus aren't referenced in other snapshots)
-        approx_size_target_snapshot_removed_bytes = len(
-            changed_blocks_after["ChangedBlocks"]) * snapshot_blocks['BlockSize']
+    target_snapshot_sizes = SCENARIO_EVALUATORS[current_eval_scenario](
+        target_snapshot, snapshot_before, snapshot_after, snapshot_blocks)
+    if target_snapshot_sizes is None:
+        error_msg = f"Unable to find snapshot during changed block analysis: {target_snapshot}"
+        logger.error(error_msg)
+        eval_data["error_message"] = error_msg
+        eval_data["error_code"] = "SNAPSHOT_NOT_FOUND"
+        return eval_data
 
-        eval_data["approx_size_target_snapshot_bytes"] = approx_size_target_snapshot_bytes
-        eval_data["approx_size_target_snapshot_removed_bytes"] = approx_size_target_snapshot_removed_bytes
+    approx_size_target_snapshot_bytes, approx_size_target_snapshot_removed_bytes = target_snapshot_sizes
+    eval_data["approx_size_target_snapshot_bytes"] = approx_size_target_snapshot_bytes
+    eval_data["approx_size_target_snapshot_removed_bytes"] = approx_size_target_snapshot_removed_bytes
 
     logger.info('Step 8 - Determining storage costs for this snapshot...')
 
     logger.info('Step 8a - Determining storage costs - Standard tier...')
     # Calculating 3-month (90 day) costs for comparison
     cost_estimate_target_snapshot_in_std_tier = (
-        bytes_to_gb(approx_size_target_snapshot_bytes) * EBS_STD_SNAPSHOT_PRICE_GB_MONTH) * decimal.Decimal("3")  # months
+        bytes_to_gb(approx_size_target_snapshot_bytes) * EBS_STD_SNAPSHOT_PRICE_GB_MONTH) * COST_ESTIMATE_MONTHS
 
     eval_data["cost_estimate_90days_target_snapshot_in_std_tier"] = cost_estimate_target_snapshot_in_std_tier
 
     logger.info('Step 8b - Determining storage costs - Archive tier...')
     cost_estimate_target_snapshot_in_archive_tier = (
-        bytes_to_gb(approx_full_snapshot_size_bytes) * EBS_ARCHIVE_SNAPSHOT_PRICE_GB_MONTH) * decimal.Decimal("3")  # months
+        bytes_to_gb(approx_full_snapshot_size_bytes) * EBS_ARCHIVE_SNAPSHOT_PRICE_GB_MONTH) * COST_ESTIMATE_MONTHS
 
     eval_data["cost_estimate_90days_target_snapshot_in_archive_tier"] = cost_estimate_target_snapshot_in_archive_tier
 
@@ -563,52 +699,77 @@ def convert_pricing_data_to_decimal(payload: dict):
 
 
 def update_ddb_table(jobid: str, snapshot_id: str, data: dict):
-    """Updates the DynamoDB Eval Results Table with the results"""
+    """Updates the DynamoDB Eval Results Table with the results
+
+    Results are stored as a native DynamoDB Map so readers get a dict back without JSON parsing.
+    """
+    data_map = ddb_serializer.serialize({
+        key: decimal_to_str(value) if isinstance(value, decimal.Decimal) else value
+        for key, value in data.items()
+    })
     logger.info(
-        f"Updating Status of snapshot ({snapshot_id}) in job ({jobid})")
+        "Updating Status of snapshot (%s) in job (%s)", snapshot_id, jobid)
     try:
         dynamodb.update_item(
-            TableName=os.environ.get('DDB_EVAL_RESULTS'),
+            TableName=eval_results_table_name,
             Key={'JobId': {'S': jobid},
                  'SnapshotId': {'S': snapshot_id}},
             UpdateExpression="SET #data = :data , completed = :completed",
             ExpressionAttributeNames={'#data': 'data'},
             ExpressionAttributeValues={
-                ':data': {'S': json.dumps(data, cls=DecimalEncoder)},
+                ':data': data_map,
                 ':completed': {'S': 'true'}
             }
         )
     except botocore.exceptions.ClientError as e:
         logger.error(
-            f"Error updating DynamoDB Item: {e.response['Error']['Message']}")
+            "Error updating DynamoDB Item: %s", e.response['Error']['Message'])
         raise
 
 
+def process_record(record: dict):
+    """Evaluates the snapshot in an SQS record and stores the result"""
+    # payload example
+    # {
+    #     "jobid": jobid,
+    #     "snapshot_id": snapshot_id,
+    #     "ddb_item_id": f"{jobid}-{snapshot_id}",
+    #     "volume_id": volume_id,    (optional)
+    #     "pricing_data": {
+    #          'std_tier_snapshot_pricing': std_tier_snapshot_pricing,
+    #          'archive_tier_snapshot_pricing': archive_tier_snapshot_pricing
+    #      }
+    # }
+    payload = json.loads(record['body'])
+    payload = convert_pricing_data_to_decimal(payload)
+    data = main(target_snapshot=payload['snapshot_id'],
+                pricing=payload['pricing_data'],
+                source_volume_id=payload.get('volume_id'),
+                jobid=payload['jobid'])
+    update_ddb_table(
+        jobid=payload['jobid'], snapshot_id=payload['snapshot_id'], data=data)
+    logger.info("Snapshot Evaluation Complete")
+
+
 def lambda_handler(event, context):
-    """Handles invocation as an AWS Lambda function"""
-    # Logger Config
-    if os.environ.get('LOG_LEVEL') == "DEBUG":
-        logger.setLevel(logging.DEBUG)
-    else:
-        logger.setLevel(logging.INFO)
+    """Handles invocation as an AWS Lambda function
 
+    Every record in the SQS batch is evaluated (concurrently). Records that fail are
+    returned as batchItemFailures so only those messages are retried.
+    """
     # Perform main business logic
-    for record in event['Records']:
-        # payload example
-        # {
-        #     "jobid": jobid,
-        #     "snapshot_id": snapshot_id,
-        #     "ddb_item_id": f"{jobid}-{snapshot_id}",
-        #     "pricing_data": {
-        #          'std_tier_snapshot_pricing': std_tier_snapshot_pricing,
-        #          'archive_tier_snapshot_pricing': archive_tier_snapshot_pricing
-        #      }
-        # }
-        payload = json.loads(record['body'])
-        payload = convert_pricing_data_to_decimal(payload)
-        data = main(target_snapshot=payload['snapshot_id'],
-                    pricing=payload['pricing_data'])
-        update_ddb_table(
-            jobid=payload['jobid'], snapshot_id=payload['snapshot_id'], data=data)
-        logger.info("Snapshot Evaluation Complete")
-        return True
+    batch_item_failures = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_RECORD_WORKERS) as executor:
+        record_futures = {executor.submit(process_record, record): record
+                          for record in event['Records']}
+        for future in concurrent.futures.as_completed(record_futures):
+            record = record_futures[future]
+            try:
+                future.result()
+            except Exception:
+                logger.exception(
+                    "Error evaluating SQS message %s", record['messageId'])
+                batch_item_failures.append(
+                    {"itemIdentifier": record['messageId']})
+
+    return {"batchItemFailures": batch_item_failures}
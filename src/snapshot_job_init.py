@@ -1,9 +1,13 @@
+import concurrent.futures
 import decimal
+import itertools
 import json
 import os
-import re
+import random
+import time
 
 import boto3
+from botocore.config import Config
 
 from datetime import datetime
 
@@ -11,26 +15,53 @@ from datetime import datetime
 aws_session = boto3.session.Session()
 current_aws_region = aws_session.region_name
 
-# Setup AWS Clients
+# Pricing data is kept in memory, so warm invocations skip the Pricing API for an hour
+PRICING_MEMORY_CACHE_TTL_SECONDS = 60 * 60
+pricing_memory_cache = {'timestamp': None, 'data': None}
+
+# SendMessageBatch accepts at most 10 messages per call, BatchWriteItem at most 25 items
+SQS_MAX_BATCH_SIZE = 10
+SQS_MAX_SEND_ATTEMPTS = 10
+DDB_MAX_BATCH_SIZE = 25
+DDB_MAX_WRITE_ATTEMPTS = 10
+
+# Number of snapshot batches (DynamoDB write then SQS sends) in flight at once
+MAX_BATCH_WORKERS = 10
+
+# Setup AWS Clients (reused across warm invocations)
+# Adaptive retries rate limit the client side when DynamoDB / SQS start throttling the batch calls.
+client_config = Config(
+    retries={'mode': 'adaptive', 'max_attempts': 10}
+)
 pricingapi = boto3.client('pricing', region_name='us-east-1')
+ec2 = boto3.client('ec2', region_name=current_aws_region, config=client_config)
+dynamodb = boto3.resource('dynamodb', region_name=current_aws_region, config=client_config)
+dynamodb_client = dynamodb.meta.client
+sqs = boto3.client('sqs', region_name=current_aws_region, config=client_config)
 
+# DynamoDB tables and SQS Queue URL from env variables
+job_tracking_table = dynamodb.Table(os.environ['DDB_JOB_TRACKING'])
+snapshot_eval_results_table = os.environ['DDB_EVAL_RESULTS']
+sqs_queue_url = os.environ['SQS_QUEUE_URL']
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            if obj.is_zero():
-                return "0"
-            return str(obj)
-        return json.JSONEncoder.default(self, obj)
+
+def decimal_to_str(obj):
+    """
+    Function to serialize Decimals (the prices) as strings. Used as json.dumps default=,
+    which (unlike a JSONEncoder subclass) keeps the C encoder for everything else.
+    """
+    if isinstance(obj, decimal.Decimal):
+        if obj.is_zero():
+            return "0"
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
 
 def list_snapshots(event):
     """
-      Function to get a list of EBS Snapshots. By default, will filter for completed snapshots
-      in the standard storage tier - owned by the current account.
+      Generator over the EBS Snapshots, yields (snapshot id, source volume id) pairs page by page.
+      By default, will filter for completed snapshots in the standard storage tier - owned by the current account.
     """
-    client = boto3.client('ec2', region_name=current_aws_region)
-    snapshot_ids = []
     default_snapshot_filter = [
         {
             'Name': 'storage-tier',
@@ -53,19 +84,31 @@ def list_snapshots(event):
     else:
         snapshot_filter = default_snapshot_filter
 
-    page_iterator = client.get_paginator('describe_snapshots').paginate(
+    page_iterator = ec2.get_paginator('describe_snapshots').paginate(
         OwnerIds=['self'],
-        Filters=snapshot_filter
+        Filters=snapshot_filter,
+        PaginationConfig={'PageSize': 1000}
     )
-    for page in page_iterator:
-        for snapshot in page['Snapshots']:
-            snapshot_ids.append(snapshot['SnapshotId'])
-    return snapshot_ids
+    # source volume id is passed on so the evaluator doesn't need to look it up
+    # JMESPath projection so only the ids are pulled out of each page
+    yield from page_iterator.search('Snapshots[].[SnapshotId, VolumeId]')
 
 
-def get_std_tier_snapshot_pricing():
-    """Function retrieves the price for EBS Standard Tier snapshot storage in the region."""
-    response = pricingapi.get_products(
+def extract_on_demand_price(price_dict: dict):
+    """
+    Function returns the description and USD price of the (single) on demand price dimension of a Pricing API product.
+    """
+    on_demand_term = next(iter(price_dict["terms"]["OnDemand"].values()))
+    price_dimension = next(iter(on_demand_term["priceDimensions"].values()))
+    return price_dimension["description"], decimal.Decimal(price_dimension["pricePerUnit"]["USD"])
+
+
+def get_std_tier_snapshot_pricing(region: str):
+    """
+    Function retrieves the price for EBS Standard Tier snapshot storage in the region.
+    """
+    # Pages are only fetched until the snapshot storage product is found
+    page_iterator = pricingapi.get_paginator('get_products').paginate(
         ServiceCode='AmazonEC2',
         Filters=[
             {
@@ -86,31 +129,32 @@ def get_std_tier_snapshot_pricing():
             {
                 "Type": "TERM_MATCH",
                 "Field": "regionCode",
-                "Value": current_aws_region
+                "Value": region
             }
         ],
         FormatVersion='aws_v1',
-        MaxResults=50,
+        PaginationConfig={'PageSize': 50},
     )
 
-    for item in response["PriceList"]:
+    for item in (item for page in page_iterator for item in page["PriceList"]):
+        # cheap check on the raw JSON, skips parsing products that can't match
+        if 'EBS:SnapshotUsage"' not in item:
+            continue
         price_dict = json.loads(item)
-        if re.search('.*EBS:SnapshotUsage$', price_dict["product"]["attributes"]["usagetype"]):
-            on_demand = price_dict["terms"]["OnDemand"]
-            on_demand_key = list(on_demand.values())[0]
-            price_dimension = on_demand_key["priceDimensions"]
-            price_dimension_key = list(price_dimension.values())[0]
-            price_description = price_dimension_key["description"]
-            price_per_unit = price_dimension_key["pricePerUnit"]["USD"]
+        # usagetype is region prefixed (e.g. APS2-EBS:SnapshotUsage), except in us-east-1
+        if price_dict["product"]["attributes"]["usagetype"].endswith('EBS:SnapshotUsage'):
+            price_description, price_per_unit = extract_on_demand_price(price_dict)
             print(f"Identified Standard Tier Pricing: {price_description}")
-            return decimal.Decimal(price_per_unit)
+            return price_per_unit
 
     raise Exception(
         'EBS Standard Storage Price not returned in Pricing API Response')
 
 
-def get_archive_tier_snapshot_pricing():
-    """Function retrieves the price for EBS Archive tier snapshot storage in the region."""
+def get_archive_tier_snapshot_pricing(region: str):
+    """
+    Function retrieves the price for EBS Archive tier snapshot storage in the region.
+    """
     response = pricingapi.get_products(
         ServiceCode='AmazonEC2',
         Filters=[
@@ -122,7 +166,7 @@ def get_archive_tier_snapshot_pricing():
             {
                 "Type": "TERM_MATCH",
                 "Field": "regionCode",
-                "Value": current_aws_region
+                "Value": region
             }
         ],
         FormatVersion='aws_v1',
@@ -131,30 +175,98 @@ def get_archive_tier_snapshot_pricing():
 
     product_price = response["PriceList"][0]
     price_dict = json.loads(product_price)
-    on_demand = price_dict["terms"]["OnDemand"]
-    on_demand_key = list(on_demand.values())[0]
-    price_dimension = on_demand_key["priceDimensions"]
-    price_dimension_key = list(price_dimension.values())[0]
-    price_description = price_dimension_key["description"]
-    price_per_unit = price_dimension_key["pricePerUnit"]["USD"]
+    price_description, price_per_unit = extract_on_demand_price(price_dict)
     print(f"Identified Archive Tier Pricing: {price_description}")
-    return decimal.Decimal(price_per_unit)
+    return price_per_unit
 
 
 def get_pricing_data():
     """Retrieve data from the AWS Pricing API and return it to the caller."""
 
+    cache_timestamp = pricing_memory_cache['timestamp']
+    if cache_timestamp is not None and time.monotonic() - cache_timestamp < PRICING_MEMORY_CACHE_TTL_SECONDS:
+        return pricing_memory_cache['data']
+
     print('Retrieving Pricing Data')
 
-    # Get pricing data
-    std_tier_snapshot_pricing = get_std_tier_snapshot_pricing()
-    archive_tier_snapshot_pricing = get_archive_tier_snapshot_pricing()
+    # Get pricing data - the two Pricing API lookups are independent, so run them concurrently
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        std_tier_future = executor.submit(get_std_tier_snapshot_pricing, current_aws_region)
+        archive_tier_future = executor.submit(get_archive_tier_snapshot_pricing, current_aws_region)
+
+        pricing_memory_cache['data'] = {
+            'std_tier_snapshot_pricing': std_tier_future.result(),
+            'archive_tier_snapshot_pricing': archive_tier_future.result()
+        }
+    pricing_memory_cache['timestamp'] = time.monotonic()
 
     # Return data
-    return {
-        'std_tier_snapshot_pricing': std_tier_snapshot_pricing,
-        'archive_tier_snapshot_pricing': archive_tier_snapshot_pricing
-    }
+    return pricing_memory_cache['data']
+
+
+def send_sqs_message_batch(entries: list):
+    """
+    Function to send a batch of (up to 10) messages to the SQS queue.
+    Entries reported as Failed are resent with exponential backoff (full jitter).
+    """
+    for attempt in range(SQS_MAX_SEND_ATTEMPTS):
+        response = sqs.send_message_batch(QueueUrl=sqs_queue_url, Entries=entries)
+        failed_ids = {failed['Id'] for failed in response.get('Failed', [])}
+        if not failed_ids:
+            return
+        entries = [entry for entry in entries if entry['Id'] in failed_ids]
+        time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+
+    raise Exception(
+        f"Unable to send {len(entries)} messages to SQS after {SQS_MAX_SEND_ATTEMPTS} attempts")
+
+
+def put_job_tracking_record(jobid: str):
+    """
+    Function to put the job record into the snapshot job tracking DynamoDB table.
+    Conditional put, so a retried execution keeps the original record (and start date).
+    """
+    try:
+        job_tracking_table.put_item(
+            Item={
+                "SnapshotJobId": jobid,
+                "DateStarted": str(datetime.now()),
+            },
+            ConditionExpression='attribute_not_exists(SnapshotJobId)'
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException:
+        print(f"Job tracking record for {jobid} already exists")
+
+
+def write_ddb_batch(items: list):
+    """
+    Function to write a batch of (up to 25) items, in DynamoDB JSON format, to the snapshot eval results table.
+    UnprocessedItems are resent with exponential backoff (full jitter).
+    """
+    request_items = {snapshot_eval_results_table: [{"PutRequest": {"Item": item}} for item in items]}
+    for attempt in range(DDB_MAX_WRITE_ATTEMPTS):
+        response = dynamodb_client.batch_write_item(RequestItems=request_items)
+        request_items = response.get('UnprocessedItems')
+        if not request_items:
+            return
+        time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+
+    raise Exception(
+        f"Unable to write {len(request_items[snapshot_eval_results_table])} items to {snapshot_eval_results_table} after {DDB_MAX_WRITE_ATTEMPTS} attempts")
+
+
+def queue_snapshot_batch(items: list, message_bodies: list):
+    """
+    Function to put a batch of (up to 25) items into the snapshot eval results DynamoDB table,
+    then push their messages to the SQS queue (10 per SendMessageBatch call).
+    The items must be written before the messages are sent - otherwise an evaluator's
+    result (completed=true) could be overwritten by the later pending item.
+    """
+    write_ddb_batch(items)
+    for i in range(0, len(message_bodies), SQS_MAX_BATCH_SIZE):
+        entries = [{"Id": str(j), "MessageBody": message_body}
+                   for j, message_body in enumerate(message_bodies[i:i + SQS_MAX_BATCH_SIZE])]
+        send_sqs_message_batch(entries)
 
 
 def get_current_statemachine_execition_name(event):
@@ -170,53 +282,53 @@ def lambda_handler(event, context):
 
     jobid = get_current_statemachine_execition_name(event)
 
-    # Get snapshot data
-    snapshot_ids = list_snapshots(event)
-
-    # Get pricing data
-    pricing_data = get_pricing_data()
-
-    # Get DynamoDB table names from env variables
-    snapshot_job_tracking_table = os.environ['DDB_JOB_TRACKING']
-    snapshot_eval_results_table = os.environ['DDB_EVAL_RESULTS']
-
-    # Put record into snapshot job tracking DynamoDB table
-    dynamodb = boto3.resource('dynamodb', region_name=current_aws_region)
-    table = dynamodb.Table(snapshot_job_tracking_table)
-    table.put_item(Item={
-        "SnapshotJobId": jobid,
-        "DateStarted": str(datetime.now()),
-    })
-
-    # Put record into snapshot eval results DynamoDB table
-    table = dynamodb.Table(snapshot_eval_results_table)
-    for snapshot_id in snapshot_ids:
-        ddb_item = {
-            "JobId": jobid,
-            "SnapshotId": snapshot_id,
-            "completed": "false"
-        }
-        table.put_item(Item=ddb_item)
-
-    # Get SQS Queue URL from env variable
-    sqs_queue_url = os.environ['SQS_QUEUE_URL']
-
-    # Push all snapshot IDs to SQS queue
-    sqs = boto3.client('sqs', region_name=current_aws_region)
-    for snapshot_id in snapshot_ids:
-        message = {
-            "jobid": jobid,
-            "snapshot_id": snapshot_id,
-            "ddb_item_id": f"{jobid}-{snapshot_id}",
-            "pricing_data": pricing_data
-        }
-        sqs.send_message(
-            QueueUrl=sqs_queue_url,
-            MessageBody=json.dumps(message, cls=DecimalEncoder)
-        )
+    # All of the work below is waiting on AWS API calls, so is spread over a thread pool.
+    # Leaving the with block waits for (and raises any exception from) every call.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_BATCH_WORKERS) as executor:
+
+        # Get pricing data and put record into snapshot job tracking DynamoDB table,
+        # while the snapshots are being described
+        pricing_future = executor.submit(get_pricing_data)
+        futures = [executor.submit(put_job_tracking_record, jobid)]
+
+        # Get snapshot data - streamed, so batches are sent while later pages are described.
+        # The first snapshot is read ahead so the first page is requested before waiting on the pricing data.
+        snapshots = list_snapshots(event)
+        first_snapshot = list(itertools.islice(snapshots, 1))
+        pricing_data = pricing_future.result()
+
+        # jobid and pricing_data are the same in every message, so are only serialized once.
+        # The per-snapshot fields are still JSON encoded - a missing VolumeId must be null
+        # (the evaluator then looks the volume up itself), not the string "None".
+        message_prefix = '{{"jobid": {}, "pricing_data": {}, '.format(
+            json.dumps(jobid), json.dumps(pricing_data, default=decimal_to_str))
+
+        # Single pass over the snapshots: each batch of 25 is put into the snapshot eval results
+        # DynamoDB table (one BatchWriteItem call) and then pushed to the SQS queue
+        number_of_snapshots = 0
+        items = []
+        message_bodies = []
+        for snapshot_id, volume_id in itertools.chain(first_snapshot, snapshots):
+            number_of_snapshots += 1
+            items.append({
+                "JobId": {"S": jobid},
+                "SnapshotId": {"S": snapshot_id},
+                "completed": {"S": "false"}
+            })
+            message_bodies.append('{}"snapshot_id": {}, "ddb_item_id": {}, "volume_id": {}}}'.format(
+                message_prefix, json.dumps(snapshot_id), json.dumps(f"{jobid}-{snapshot_id}"), json.dumps(volume_id)))
+            if len(items) == DDB_MAX_BATCH_SIZE:
+                futures.append(executor.submit(queue_snapshot_batch, items, message_bodies))
+                items = []
+                message_bodies = []
+
+        if items:
+            futures.append(executor.submit(queue_snapshot_batch, items, message_bodies))
+
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
 
     wait_in_seconds = 900    # 15 minutes
-    number_of_snapshots = len(snapshot_ids)
     if number_of_snapshots < 1000:
         wait_in_seconds = 60
     elif number_of_snapshots < 5000: